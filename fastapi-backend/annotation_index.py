@@ -0,0 +1,272 @@
+"""
+COCO 标注的内存索引
+
+从 PointLabel2COCO 输出的 COCO 文件（或内存中的数据字典）一次性建立索引：
+按图片ID、文件名、类别的哈希表，以及按图片划分的网格空间索引，
+并预先统计每个类别的数量和尺寸分布，查询时不再需要线性扫描整个文件。
+空间索引以标注点（point）为准；PointLabel2COCO 生成的 bbox 只是围绕点的固定大小框，
+没有 point 的标注才按 bbox 索引。
+"""
+import json
+import math
+import os
+import threading
+from collections import defaultdict
+
+# 空间网格单元大小（像素）
+GRID_CELL_SIZE = 64
+
+# 尺寸直方图的分箱边界，按 sqrt(area) 计算（像素）
+SIZE_BINS = (8, 16, 32, 64, 128, 256, 512)
+
+
+def _size_bin_labels():
+    labels = []
+    lower = 0
+    for upper in SIZE_BINS:
+        labels.append(f'{lower}-{upper}')
+        lower = upper
+    labels.append(f'{lower}+')
+    return labels
+
+
+SIZE_BIN_LABELS = _size_bin_labels()
+
+
+def _size_bin(area):
+    side = math.sqrt(max(area, 0))
+    for i, upper in enumerate(SIZE_BINS):
+        if side < upper:
+            return i
+    return len(SIZE_BINS)
+
+
+def _spatial_extent(ann):
+    """
+    返回标注用于空间查询的范围 (x_min, y_min, x_max, y_max)
+    有 point 时为该点，否则为 bbox（COCO 格式 [x, y, w, h]）；都没有或坐标不是有限数时返回 None
+    """
+    if ann.get('point') is not None:
+        x, y = ann['point']
+        extent = (x, y, x, y)
+    elif ann.get('bbox') is not None:
+        x, y, w, h = ann['bbox']
+        extent = (x, y, x + w, y + h)
+    else:
+        return None
+    if not all(math.isfinite(v) for v in extent):
+        return None
+    return extent
+
+
+class AnnotationIndex:
+    """
+    COCO 数据集的内存索引
+    用法:
+        index = AnnotationIndex.from_file('uploads/coco_format_point_labels.json')
+        index.query(image='00006.jpg', category='person', bbox=(0, 0, 200, 200))
+    """
+
+    def __init__(self, dataset: dict, cell_size: int = GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.images = {}             # image_id -> image
+        self.images_by_name = {}     # file_name -> image
+        self.categories = {}         # category_id -> category
+        self.categories_by_name = {}  # name -> category
+        self.annotations = dataset.get('annotations', [])
+        self.by_image = defaultdict(list)     # image_id -> [ann]
+        self.by_category = defaultdict(list)  # category_id -> [ann]
+        # image_id -> {(gx, gy): [ann]}
+        self._grid = defaultdict(lambda: defaultdict(list))
+        # image_id -> [gx_min, gy_min, gx_max, gy_max]，有标注的网格单元范围
+        self._grid_bounds = {}
+
+        for image in dataset.get('images', []):
+            self.images[image['id']] = image
+            self.images_by_name[image['file_name']] = image
+        for category in dataset.get('categories', []):
+            self.categories[category['id']] = category
+            self.categories_by_name[category['name']] = category
+
+        self.class_counts = defaultdict(int)
+        self.size_histograms = defaultdict(lambda: [0] * len(SIZE_BIN_LABELS))
+        for ann in self.annotations:
+            self._add(ann)
+
+    @classmethod
+    def from_file(cls, path, cell_size: int = GRID_CELL_SIZE):
+        """从 COCO 格式的 JSON 文件建立索引"""
+        with open(path, 'r') as f:
+            dataset = json.load(f)
+        return cls(dataset, cell_size)
+
+    def _add(self, ann):
+        image_id = ann['image_id']
+        category_id = ann['category_id']
+        self.by_image[image_id].append(ann)
+        self.by_category[category_id].append(ann)
+        self.class_counts[category_id] += 1
+        self.size_histograms[category_id][_size_bin(ann.get('area', 0))] += 1
+
+        extent = _spatial_extent(ann)
+        if extent is None:
+            return
+        gx0, gy0, gx1, gy1 = self._cell_range(*extent)
+        grid = self._grid[image_id]
+        for gx in range(gx0, gx1 + 1):
+            for gy in range(gy0, gy1 + 1):
+                grid[(gx, gy)].append(ann)
+
+        bounds = self._grid_bounds.get(image_id)
+        if bounds is None:
+            self._grid_bounds[image_id] = [gx0, gy0, gx1, gy1]
+        else:
+            bounds[0] = min(bounds[0], gx0)
+            bounds[1] = min(bounds[1], gy0)
+            bounds[2] = max(bounds[2], gx1)
+            bounds[3] = max(bounds[3], gy1)
+
+    def _cell_range(self, x_min, y_min, x_max, y_max):
+        size = self.cell_size
+        return (math.floor(x_min / size), math.floor(y_min / size),
+                math.floor(x_max / size), math.floor(y_max / size))
+
+    def resolve_image(self, image):
+        """根据图片ID或文件名查找图片，找不到返回 None"""
+        if image in self.images_by_name:
+            return self.images_by_name[image]
+        try:
+            return self.images.get(int(image))
+        except (TypeError, ValueError):
+            return None
+
+    def resolve_category(self, category):
+        """根据类别ID或名称查找类别，找不到返回 None"""
+        if category in self.categories_by_name:
+            return self.categories_by_name[category]
+        try:
+            return self.categories.get(int(category))
+        except (TypeError, ValueError):
+            return None
+
+    def query_bbox(self, image_id, bbox):
+        """
+        查询某张图片中位于矩形区域内的标注（有 point 的按点判断，否则按 bbox 相交判断）
+        参数:
+            image_id - 图片ID
+            bbox - (x_min, y_min, x_max, y_max)
+        坐标不是有限数时抛出 ValueError
+        """
+        if not all(math.isfinite(v) for v in bbox):
+            raise ValueError(f"bbox 坐标必须是有限数: {bbox}")
+        grid = self._grid.get(image_id)
+        if not grid:
+            return []
+        x_min, y_min, x_max, y_max = bbox
+
+        # 查询范围限制在该图片有标注的网格单元内
+        gx0, gy0, gx1, gy1 = self._cell_range(x_min, y_min, x_max, y_max)
+        bx0, by0, bx1, by1 = self._grid_bounds[image_id]
+        gx0, gy0 = max(gx0, bx0), max(gy0, by0)
+        gx1, gy1 = min(gx1, bx1), min(gy1, by1)
+        if gx0 > gx1 or gy0 > gy1:
+            return []
+        if (gx1 - gx0 + 1) * (gy1 - gy0 + 1) > len(grid):
+            # 范围内的单元比实际有标注的单元还多，直接遍历有标注的单元
+            cells = [cell for cell in grid if gx0 <= cell[0] <= gx1 and gy0 <= cell[1] <= gy1]
+        else:
+            cells = [(gx, gy) for gx in range(gx0, gx1 + 1) for gy in range(gy0, gy1 + 1)]
+
+        seen = set()
+        results = []
+        for cell in cells:
+            for ann in grid.get(cell, ()):
+                if id(ann) in seen:
+                    continue
+                seen.add(id(ann))
+                ax_min, ay_min, ax_max, ay_max = _spatial_extent(ann)
+                if ax_min <= x_max and ax_max >= x_min and ay_min <= y_max and ay_max >= y_min:
+                    results.append(ann)
+        results.sort(key=lambda ann: ann['id'])
+        return results
+
+    def query(self, image=None, category=None, bbox=None):
+        """
+        按图片、类别、区域组合查询标注
+        参数:
+            image - 图片ID或文件名（可选）
+            category - 类别ID或名称（可选）
+            bbox - (x_min, y_min, x_max, y_max)，指定时按区域过滤（可选），
+                   有 point 的标注按点是否在区域内过滤，否则按 bbox 是否相交；坐标不是有限数时抛出 ValueError
+        返回: 标注列表；图片或类别不存在时返回空列表
+        """
+        image_ids = None
+        if image is not None:
+            found = self.resolve_image(image)
+            if found is None:
+                return []
+            image_ids = [found['id']]
+
+        category_id = None
+        if category is not None:
+            found = self.resolve_category(category)
+            if found is None:
+                return []
+            category_id = found['id']
+
+        if bbox is not None:
+            if image_ids is None:
+                image_ids = list(self._grid.keys())
+            results = []
+            for image_id in image_ids:
+                results.extend(self.query_bbox(image_id, bbox))
+        elif image_ids is not None:
+            results = self.by_image.get(image_ids[0], [])
+        elif category_id is not None:
+            return list(self.by_category.get(category_id, []))
+        else:
+            return list(self.annotations)
+
+        if category_id is not None:
+            results = [ann for ann in results if ann['category_id'] == category_id]
+        return list(results)
+
+    def stats(self):
+        """预先统计好的数据集信息：图片数、标注数、每个类别的数量和尺寸直方图"""
+        categories = []
+        for category_id, category in sorted(self.categories.items()):
+            categories.append({
+                'id': category_id,
+                'name': category['name'],
+                'count': self.class_counts.get(category_id, 0),
+                'size_histogram': dict(zip(SIZE_BIN_LABELS,
+                                           self.size_histograms.get(category_id, [0] * len(SIZE_BIN_LABELS)))),
+            })
+        return {
+            'image_count': len(self.images),
+            'annotation_count': len(self.annotations),
+            'size_bins': SIZE_BIN_LABELS,
+            'categories': categories,
+        }
+
+
+class AnnotationIndexFile:
+    """
+    绑定到 COCO 文件的索引缓存
+    文件修改时间变化（例如重新运行了 PointLabel2COCO）时自动重建索引
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime_ns = None
+
+    def get(self) -> AnnotationIndex:
+        """获取最新的索引，文件不存在时抛出 FileNotFoundError"""
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        with self._lock:
+            if self._index is None or mtime_ns != self._mtime_ns:
+                self._index = AnnotationIndex.from_file(self.path)
+                self._mtime_ns = mtime_ns
+            return self._index
@@ -0,0 +1,170 @@
+"""
+点标注增量检测的会话与特征缓存
+
+点提示检测流程中，用户每次增删/拖动标注点后都要重新检测，但图片本身没有变化。
+图片在创建会话时只上传、解码一次，提取的图像特征保存在会话中；
+之后的请求只发送标注点的变化，复用会话的特征，只重新运行依赖标注点的部分。
+"""
+import math
+import threading
+import uuid
+from collections import OrderedDict
+
+# 会话的最大数量，超出后淘汰最久未使用的；会话的特征随会话保存，与会话一起淘汰
+SESSION_LIMIT = 32
+# /api/detect 按内容哈希缓存的特征数量，与会话的特征分开，大量上传不会挤掉会话的特征
+FEATURE_CACHE_SIZE = 64
+
+
+class LRUCache:
+    """线程安全的 LRU 缓存"""
+
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """获取缓存项，不存在返回 None"""
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._items.pop(key, None)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _check_point(point):
+    """检查标注点格式: {"x": 数值, "y": 数值, "label": 字符串}"""
+    if not isinstance(point, dict):
+        raise ValueError(f"标注点格式无效: {point}")
+    for key in ('x', 'y'):
+        value = point.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"标注点坐标 {key} 无效: {value}")
+    if not isinstance(point.get('label'), str):
+        raise ValueError(f"标注点 label 无效: {point.get('label')}")
+    return point
+
+
+def validate_points(points: list) -> list:
+    """检查完整的标注点列表，格式无效时抛出 ValueError"""
+    if not isinstance(points, list):
+        raise ValueError("标注数据应为列表")
+    return [_check_point(point) for point in points]
+
+
+def apply_point_changes(points: list, changes: list) -> list:
+    """
+    按顺序把标注点的变化应用到点列表上，返回新列表
+    参数:
+        points - 当前的标注点列表 [{"x": 100, "y": 200, "label": "点1"}, ...]
+        changes - 变化列表，每项为以下之一:
+            {"op": "add", "point": {...}}
+            {"op": "update", "index": 0, "point": {...}}
+            {"op": "remove", "index": 0}
+    索引越界、操作类型未知或标注点格式无效时抛出 ValueError
+    """
+    points = list(points)
+    for change in changes:
+        op = change.get('op')
+        if op == 'add':
+            points.append(_check_point(change.get('point')))
+            continue
+
+        index = change.get('index')
+        if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(points):
+            raise ValueError(f"标注点索引无效: {index}")
+        if op == 'update':
+            points[index] = _check_point(change.get('point'))
+        elif op == 'remove':
+            del points[index]
+        else:
+            raise ValueError(f"未知的操作类型: {op}")
+    return points
+
+
+class VersionConflict(Exception):
+    """客户端的标注点版本与会话不一致"""
+
+    def __init__(self, current_version):
+        super().__init__(f"会话当前版本为 {current_version}")
+        self.current_version = current_version
+
+
+class DetectionSession:
+    """
+    一张图片的检测会话
+    图片按内容哈希（image_id）引用，不依赖上传目录中可能被同名文件覆盖的路径。
+    features 为该图片的特征，随会话保存，为 None 时需要重新提取。
+    version 在每次成功检测后加一，客户端据此确认自己持有的是最新的点列表
+    """
+
+    def __init__(self, image_id, filename, points=None, features=None):
+        self.session_id = uuid.uuid4().hex
+        self.image_id = image_id
+        self.filename = filename
+        self.points = list(points or [])
+        self.features = features
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def prepare(self, base_version: int, changes: list) -> list:
+        """
+        在当前点列表上应用变化，返回新的点列表，不修改会话
+        base_version 与当前版本不一致时抛出 VersionConflict，变化无效时抛出 ValueError
+        """
+        with self.lock:
+            if base_version != self.version:
+                raise VersionConflict(self.version)
+            return apply_point_changes(self.points, changes)
+
+    def commit(self, base_version: int, points: list) -> int:
+        """
+        检测成功后保存新的点列表，返回新版本号
+        期间会话已被其他请求更新时抛出 VersionConflict
+        """
+        with self.lock:
+            if base_version != self.version:
+                raise VersionConflict(self.version)
+            self.points = list(points)
+            self.version += 1
+            return self.version
+
+
+class SessionStore:
+    """检测会话存储，按最近使用淘汰"""
+
+    def __init__(self, max_sessions=SESSION_LIMIT):
+        self._sessions = LRUCache(max_sessions)
+
+    def create(self, image_id, filename, points=None, features=None) -> DetectionSession:
+        session = DetectionSession(image_id, filename, points, features)
+        self._sessions.put(session.session_id, session)
+        return session
+
+    def get(self, session_id) -> DetectionSession:
+        """获取会话，不存在或已被淘汰时抛出 KeyError"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def remove(self, session_id):
+        self._sessions.pop(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
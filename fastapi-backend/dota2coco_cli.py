@@ -0,0 +1,155 @@
+"""
+标注转换命令行
+
+    python dota2coco_cli.py convert-points uploads/ uploads/coco_format_point_labels.json --classes custom
+    python dota2coco_cli.py convert-train DIOR/ DIOR/train.json --classes dior --unmatched-dir DIOR/labelTxt_obb_pt_test
+    python dota2coco_cli.py convert-test DOTA/test/ DOTA/test.json --classes dota15 --image-ext png
+    python dota2coco_cli.py merge all.json a.json b.json
+    python dota2coco_cli.py startup-check
+
+--classes 可以是预设类别集合名（dota15 / dota16 / dior / dior_all / custom）、
+逗号分隔的类别列表，或 @文件路径（每行一个类别）。
+转换函数在 test_dota2coco_P2B_obb.py 中，只在执行对应子命令时导入。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# 预设类别集合 -> test_dota2coco_P2B_obb 中的变量名
+CLASS_SETS = {
+    'dota15': 'wordname_15',
+    'dota16': 'wordname_16',
+    'dior': 'word_name_dior',
+    'dior_all': 'word_name_dior_all',
+    'custom': 'custom_categories',
+}
+
+# 模块导入耗时预算（毫秒），以及导入时不应加载的重量级库
+STARTUP_BUDGET_MS = 100.0
+STARTUP_MODULES = ('test_dota2coco_P2B_obb', 'dota2coco_cli')
+HEAVY_MODULES = ('cv2', 'PIL', 'numpy')
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_classes(value):
+    """解析 --classes 参数，返回类别名称列表"""
+    if value in CLASS_SETS:
+        import test_dota2coco_P2B_obb as converter
+        return list(getattr(converter, CLASS_SETS[value]))
+    if value.startswith('@'):
+        with open(value[1:], 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def parse_exts(value):
+    return tuple(e.strip().lstrip('.') for e in value.split(',') if e.strip())
+
+
+def cmd_convert_train(args):
+    import test_dota2coco_P2B_obb as converter
+    converter.DOTA2COCOTrain(args.src, args.dest, parse_classes(args.classes),
+                             label_dir=args.label_dir, image_exts=parse_exts(args.image_ext),
+                             unmatched_dir=args.unmatched_dir)
+
+
+def cmd_convert_test(args):
+    import test_dota2coco_P2B_obb as converter
+    converter.DOTA2COCOTest(args.src, args.dest, parse_classes(args.classes),
+                            image_exts=parse_exts(args.image_ext))
+
+
+def cmd_convert_points(args):
+    import test_dota2coco_P2B_obb as converter
+    converter.PointLabel2COCO(args.src, args.dest, parse_classes(args.classes),
+                              image_exts=parse_exts(args.image_ext))
+
+
+def cmd_merge(args):
+    import test_dota2coco_P2B_obb as converter
+    converter.MergeCOCO(args.srcs, args.dest)
+
+
+def measure_import(module, runs):
+    """
+    在新的解释器进程中测量导入模块的耗时
+    返回: (耗时中位数毫秒, 导入后已加载的重量级库)
+    """
+    code = (
+        'import sys, time\n'
+        't = time.perf_counter()\n'
+        f'import {module}\n'
+        'elapsed = (time.perf_counter() - t) * 1000\n'
+        f'heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n'
+        'print(elapsed, ",".join(heavy))\n'
+    )
+    timings = []
+    heavy = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=BACKEND_DIR, text=True)
+        elapsed, _, loaded = output.strip().partition(' ')
+        timings.append(float(elapsed))
+        heavy = [m for m in loaded.split(',') if m]
+    return statistics.median(timings), heavy
+
+
+def cmd_startup_check(args):
+    """检查各模块的导入耗时是否在预算内，且没有在导入时加载重量级库"""
+    failed = False
+    for module in STARTUP_MODULES:
+        elapsed, heavy = measure_import(module, args.runs)
+        ok = elapsed <= args.budget_ms and not heavy
+        failed = failed or not ok
+        status = 'OK' if ok else 'FAIL'
+        loaded = f"，加载了 {', '.join(heavy)}" if heavy else ''
+        print(f'[{status}] import {module}: {elapsed:.1f} ms (预算 {args.budget_ms:.0f} ms){loaded}')
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='DOTA / 点标注转换为 COCO 格式')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_convert_args(sub, default_classes):
+        sub.add_argument('src', help='数据源路径，包含 images/ 和标注目录')
+        sub.add_argument('dest', help='输出 JSON 文件路径')
+        sub.add_argument('--classes', default=default_classes,
+                         help=f'类别：预设集合（{", ".join(CLASS_SETS)}）、逗号分隔列表或 @文件')
+        sub.add_argument('--image-ext', default='jpg,jpeg,png,bmp', help='图片扩展名，逗号分隔，同名时按顺序优先')
+
+    sub = subparsers.add_parser('convert-train', help='转换带旋转框和点的训练标注')
+    add_convert_args(sub, 'dior_all')
+    sub.add_argument('--label-dir', default='label', help='标注目录名（相对 src）')
+    sub.add_argument('--unmatched-dir', help='找不到图片的标注文件移动到此目录，不指定则跳过')
+    sub.set_defaults(func=cmd_convert_train)
+
+    sub = subparsers.add_parser('convert-test', help='生成只包含图片信息的测试集文件')
+    add_convert_args(sub, 'dota15')
+    sub.set_defaults(func=cmd_convert_test)
+
+    sub = subparsers.add_parser('convert-points', help='转换点标注（模型推理用）')
+    add_convert_args(sub, 'custom')
+    sub.set_defaults(func=cmd_convert_points)
+
+    sub = subparsers.add_parser('merge', help='合并多个 COCO 文件')
+    sub.add_argument('dest', help='输出 JSON 文件路径')
+    sub.add_argument('srcs', nargs='+', help='输入 JSON 文件')
+    sub.set_defaults(func=cmd_merge)
+
+    sub = subparsers.add_parser('startup-check', help='检查模块导入耗时是否在预算内')
+    sub.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS, help='单个模块的导入耗时预算（毫秒）')
+    sub.add_argument('--runs', type=int, default=5, help='测量次数，取中位数')
+    sub.set_defaults(func=cmd_startup_check)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
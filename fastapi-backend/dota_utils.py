@@ -1,9 +1,9 @@
 import sys
 import codecs
-import numpy as np
 import os
 import re
 import math
+from file_discovery import GetFileFromThisRootDir, iter_files
 # import polyiou
 """
     some basic functions which are useful for process DOTA data
@@ -15,19 +15,6 @@ wordname_15 = ['plane', 'baseball-diamond', 'bridge', 'ground-track-field', 'sma
 def custombasename(fullname):
     return os.path.basename(os.path.splitext(fullname)[0])
 
-def GetFileFromThisRootDir(dir,ext = None):
-  allfiles = []
-  needExtFilter = (ext != None)
-  for root,dirs,files in os.walk(dir):
-    for filespath in files:
-      filepath = os.path.join(root, filespath)
-      extension = os.path.splitext(filepath)[1][1:]
-      if needExtFilter and extension in ext:
-        allfiles.append(filepath)
-      elif not needExtFilter:
-        allfiles.append(filepath)
-  return allfiles
-
 def TuplePoly2Poly(poly):
     outpoly = [poly[0][0], poly[0][1],
                        poly[1][0], poly[1][1],
@@ -198,6 +185,8 @@ def polygonToRotRectangle(bbox):
     :param bbox: The polygon stored in format [x1, y1, x2, y2, x3, y3, x4, y4]
     :return: Rotated Rectangle in format [cx, cy, w, h, theta]
     """
+    import numpy as np  # 只有这里用到 numpy，延迟导入以加快模块导入
+
     bbox = np.array(bbox,dtype=np.float32)
     bbox = np.reshape(bbox,newshape=(2,4),order='F')
     angle = math.atan2(-(bbox[0,1]-bbox[0,0]),bbox[1,1]-bbox[1,0])
@@ -0,0 +1,136 @@
+"""
+基于 os.scandir 的文件查找
+
+- iter_files: 惰性遍历目录，按扩展名集合精确过滤（不区分大小写）
+- ImageIndex: 一次遍历图片目录（不含子目录）建立 文件名(不含扩展名) -> 图片路径 的索引，
+  目录修改时间不变时不重新扫描，适合几十万文件的数据集目录
+"""
+import os
+import threading
+
+# 默认支持的图片格式，同名文件按此顺序优先
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'bmp')
+
+
+def normalize_extensions(ext):
+    """
+    把扩展名参数统一为小写、不带点的集合
+    ext 可以是 None、单个字符串（'txt' / '.txt'）或字符串列表
+    """
+    if ext is None:
+        return None
+    if isinstance(ext, str):
+        ext = [ext]
+    return {e.lower().lstrip('.') for e in ext}
+
+
+def _extension(name):
+    return os.path.splitext(name)[1][1:].lower()
+
+
+def iter_files(root, ext=None):
+    """
+    递归遍历目录，逐个返回文件路径
+    参数:
+        root - 根目录
+        ext - 扩展名过滤，见 normalize_extensions；None 表示不过滤
+    """
+    exts = normalize_extensions(ext)
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        # 与 os.walk 默认行为一致：指向目录的符号链接不当作文件，也不进入
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif exts is None or _extension(entry.name) in exts:
+                        yield entry.path
+        except OSError:
+            continue
+        # 保持与 os.walk 相同的自顶向下顺序
+        stack.extend(reversed(subdirs))
+
+
+def GetFileFromThisRootDir(dir, ext=None):
+    """返回目录下所有（符合扩展名的）文件路径列表"""
+    return list(iter_files(dir, ext))
+
+
+class ImageIndex:
+    """
+    文件名(不含扩展名) -> 图片路径 的索引
+    只索引 root 目录本身的图片，不进入子目录（与按 root/<stem>.<ext> 查找的行为一致），
+    同名不同格式的图片按 extensions 的顺序取第一个
+    """
+
+    def __init__(self, root, extensions=IMAGE_EXTENSIONS):
+        self.root = root
+        self.extensions = tuple(e.lower().lstrip('.') for e in extensions)
+        self._priority = {e: i for i, e in enumerate(self.extensions)}
+        self._lock = threading.Lock()
+        self._mtime = None     # 上次扫描时目录的修改时间
+        self._stems = {}       # stem -> [path]
+        self.refresh()
+
+    def refresh(self):
+        """
+        增量刷新索引：目录修改时间没有变化时不重新扫描
+        在目录中新增、删除、重命名文件都会改变该目录的修改时间
+        """
+        with self._lock:
+            try:
+                mtime = os.stat(self.root).st_mtime_ns
+            except OSError:
+                self._mtime = None
+                self._stems = {}
+                return
+            if mtime != self._mtime:
+                self._stems = self._scan()
+                self._mtime = mtime
+
+    def _scan(self):
+        stems = {}
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        continue
+                    stem, extension = os.path.splitext(entry.name)
+                    if extension[1:].lower() in self._priority:
+                        stems.setdefault(stem, []).append(entry.path)
+        except OSError:
+            pass
+        return stems
+
+    def get(self, stem):
+        """根据文件名(不含扩展名)查找图片路径，找不到返回 None"""
+        paths = self._stems.get(stem)
+        if not paths:
+            return None
+        return min(paths, key=lambda p: self._priority[_extension(p)])
+
+    def __len__(self):
+        return len(self._stems)
+
+
+_image_indexes = {}
+_image_indexes_lock = threading.Lock()
+
+
+def get_image_index(root, extensions=IMAGE_EXTENSIONS):
+    """
+    获取目录的图片索引（进程内缓存），每次调用都会做一次增量刷新
+    """
+    key = (os.path.abspath(root), tuple(extensions))
+    with _image_indexes_lock:
+        index = _image_indexes.get(key)
+        if index is None:
+            index = ImageIndex(root, extensions)
+            _image_indexes[key] = index
+            return index
+    index.refresh()
+    return index
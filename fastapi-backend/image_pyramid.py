@@ -0,0 +1,185 @@
+"""
+上传图片的多分辨率金字塔（缩略图缓存）
+
+每张上传图片按内容哈希登记一次，保存一份按哈希存放的原图副本，并预先生成
+256 / 1024 两级缩略图缓存在磁盘上，full 级别即原图副本。上传目录按文件名保存，
+同名上传会覆盖，按哈希存放的副本则不会变化，检测和特征提取也读取这份副本。
+前端按显示尺寸挑选合适的级别，标注和检测坐标始终以原图像素为准，缩略图只用于显示。
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+# 缩略图的最长边（像素），从大到小依次生成
+PYRAMID_LEVELS = (1024, 256)
+FULL_LEVEL = 'full'
+
+THUMB_FORMAT = 'JPEG'
+THUMB_QUALITY = 85
+
+_IMAGE_ID_RE = re.compile(r'^[0-9a-f]{16}$')
+
+# EXIF 方向标签，取值 5~8 表示图片需要旋转 90°/270° 显示
+EXIF_ORIENTATION = 0x0112
+
+
+def compute_image_id(content: bytes) -> str:
+    """根据图片内容计算缓存键（sha256 前 16 位）"""
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+class ImagePyramid:
+    """
+    图片金字塔缓存
+    目录结构:
+        cache_dir/<image_id>/meta.json   原图副本路径、尺寸和各级别信息
+        cache_dir/<image_id>/source.jpg  原图副本（扩展名与上传文件一致）
+        cache_dir/<image_id>/256.jpg     缩略图
+        cache_dir/<image_id>/1024.jpg
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._build_locks = {}  # image_id -> 生成该图片缩略图时持有的锁
+
+    def register(self, image_path, content: bytes = None) -> dict:
+        """
+        登记一张图片，保存原图副本并生成缩略图（已存在则直接返回缓存的元数据）
+        参数:
+            image_path - 上传的图片路径
+            content - 原图字节内容，已读入内存时传入可避免重复读文件
+        返回: 元数据字典 {"image_id", "width", "height", "levels": [...]}
+        """
+        if content is None:
+            with open(image_path, 'rb') as f:
+                content = f.read()
+        image_id = compute_image_id(content)
+
+        with self._lock:
+            meta = self._load_meta(image_id)
+            if meta is not None and self._source_exists(meta):
+                return meta
+            build_lock = self._build_locks.setdefault(image_id, threading.Lock())
+
+        # 按图片加锁：同一张图片只生成一次，不同图片的缩略图可以并行生成
+        with build_lock:
+            with self._lock:
+                meta = self._load_meta(image_id)
+            if meta is not None and self._source_exists(meta):
+                return meta
+            meta = self._build(image_id, Path(image_path).suffix.lower(), content)
+            with self._lock:
+                self._meta[image_id] = meta
+            return meta
+
+    def get_meta(self, image_id: str) -> dict:
+        """获取已登记图片的元数据，不存在时抛出 KeyError"""
+        if not _IMAGE_ID_RE.match(image_id):
+            raise KeyError(image_id)
+        with self._lock:
+            meta = self._load_meta(image_id)
+        if meta is None:
+            raise KeyError(image_id)
+        return meta
+
+    def level_path(self, image_id: str, level: str) -> Path:
+        """
+        获取某一级别图片的文件路径，full 级别为按哈希存放的原图副本
+        图片未登记或级别不存在时抛出 KeyError，缓存文件已被删除时抛出 FileNotFoundError
+        """
+        meta = self.get_meta(image_id)
+        if level == FULL_LEVEL:
+            if not self._source_exists(meta):
+                raise FileNotFoundError(meta['source'])
+            return Path(meta['source'])
+
+        for item in meta['levels']:
+            if item['level'] == level and item['level'] != FULL_LEVEL:
+                path = self.cache_dir / image_id / item['file']
+                if not path.exists():
+                    raise FileNotFoundError(str(path))
+                return path
+        raise KeyError(level)
+
+    def _load_meta(self, image_id):
+        meta = self._meta.get(image_id)
+        if meta is not None:
+            return meta
+        meta_path = self.cache_dir / image_id / 'meta.json'
+        if not meta_path.exists():
+            return None
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        self._meta[image_id] = meta
+        return meta
+
+    @staticmethod
+    def _source_exists(meta) -> bool:
+        return os.path.exists(meta['source'])
+
+    def _build(self, image_id, suffix, content: bytes) -> dict:
+        target_dir = self.cache_dir / image_id
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+        # 原图副本按内容哈希存放，写入后不再变化
+        image_path = target_dir / f'source{suffix}'
+        tmp_path = target_dir / f'source{suffix}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, image_path)
+
+        with Image.open(image_path) as img:
+            # 尺寸按 EXIF 方向旋转后计算，与浏览器显示原图（full 级别）的方向一致
+            width, height = img.size
+            if img.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                width, height = height, width
+            # JPEG 可以在解码时直接按 1/2、1/4、1/8 缩小，避免解码完整分辨率
+            img.draft('RGB', (PYRAMID_LEVELS[0], PYRAMID_LEVELS[0]))
+            current = ImageOps.exif_transpose(img).convert('RGB')
+
+        levels = []
+        # 从大到小逐级缩小，每一级都基于上一级生成
+        for size in PYRAMID_LEVELS:
+            if max(width, height) <= size:
+                continue
+            current = current.copy()
+            current.thumbnail((size, size), Image.Resampling.LANCZOS)
+            filename = f'{size}.jpg'
+            # 先写临时文件再替换，避免正在读取的缩略图被写了一半
+            tmp_path = target_dir / f'{filename}.tmp'
+            current.save(tmp_path, THUMB_FORMAT, quality=THUMB_QUALITY)
+            os.replace(tmp_path, target_dir / filename)
+            levels.append({
+                'level': str(size),
+                'file': filename,
+                'width': current.width,
+                'height': current.height,
+            })
+        levels.reverse()
+        levels.append({
+            'level': FULL_LEVEL,
+            'file': image_path.name,
+            'width': width,
+            'height': height,
+        })
+
+        meta = {
+            'image_id': image_id,
+            'source': str(image_path),
+            'width': width,
+            'height': height,
+            'levels': levels,
+        }
+        tmp_path = target_dir / 'meta.json.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, target_dir / 'meta.json')
+        return meta
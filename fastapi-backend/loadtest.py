@@ -0,0 +1,508 @@
+"""
+检测接口压力测试工具
+
+在进程内通过 ASGI 直接驱动 FastAPI 应用，或者压测本地运行的 uvicorn，
+使用合成的图片和标注点，按多个并发级别（闭环）或请求速率（开环）扫描，
+统计吞吐量、p50/p95/p99 延迟、错误率和内存。进程内模式下内存是压测进程本身
+（客户端 + 应用）的 RSS，压测 uvicorn 时是 --server-pid 指定的服务端进程的 RSS。
+默认每次上传的图片内容都不同（--image-cache cold），测量不命中特征缓存的完整耗时。
+结果保存为 JSON，附带当前 git 提交，可以与之前的结果对比。
+
+用法:
+    # 进程内压测，用假检测器（特征提取 150ms + 检测头 50ms）
+    python loadtest.py --detector fake --feature-ms 150 --head-ms 50 --concurrency 1,4,16
+
+    # 开环压测本地 uvicorn（服务端进程号用于采集内存）
+    python loadtest.py --url http://localhost:8000 --mode open --rates 2,5,10 --server-pid 12345
+
+    # 增量检测会话场景，并与之前的结果对比
+    python loadtest.py --scenario session --output new.json --compare old.json
+"""
+import argparse
+import asyncio
+import importlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+DEFAULT_CONCURRENCY = '1,2,4,8'
+DEFAULT_RATES = '1,2,5,10'
+DEFAULT_IMAGE_SIZES = '640x480,1024x768,2048x1536'
+
+# 所有客户端共享的上传计数，cold 模式下用来让每次上传的图片内容都不同
+_upload_counter = itertools.count()
+
+
+class FakeDetector:
+    """
+    可配置耗时的假检测器，替换 main 模块中的 extract_image_features / run_detection
+    参数:
+        feature_ms - 图像特征提取耗时（毫秒）
+        head_ms - 依赖标注点的检测部分耗时（毫秒）
+        jitter - 耗时的随机浮动比例，0.1 表示 ±10%
+    """
+
+    def __init__(self, feature_ms=150.0, head_ms=50.0, jitter=0.0):
+        self.feature_ms = feature_ms
+        self.head_ms = head_ms
+        self.jitter = jitter
+
+    async def _sleep(self, ms):
+        if self.jitter:
+            ms *= 1 + random.uniform(-self.jitter, self.jitter)
+        await asyncio.sleep(ms / 1000)
+
+    async def extract_image_features(self, image_path):
+        await self._sleep(self.feature_ms)
+        return {"width": 0, "height": 0}
+
+    async def run_detection(self, image_path, annotations=None, features=None):
+        if features is None:
+            features = await self.extract_image_features(image_path)
+        await self._sleep(self.head_ms)
+        return {
+            "detections": [{"bbox": [100, 100, 200, 200], "label": "person", "confidence": 0.95}],
+            "image_width": 640,
+            "image_height": 480,
+            "used_annotations": len(annotations) if annotations else 0
+        }
+
+    def install(self, app_module):
+        app_module.extract_image_features = self.extract_image_features
+        app_module.run_detection = self.run_detection
+
+
+def load_detector(spec, args):
+    """
+    根据 --detector 参数创建检测器
+    app: 使用应用自带的检测函数；fake: FakeDetector；module:Class: 自定义检测器类，
+    需要提供与 FakeDetector 相同的 install(app_module) 方法
+    """
+    if spec == 'app':
+        return None
+    if spec == 'fake':
+        return FakeDetector(args.feature_ms, args.head_ms, args.jitter)
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise SystemExit(f"--detector 应为 app、fake 或 module:Class，收到 {spec}")
+    detector_cls = getattr(importlib.import_module(module_name), class_name)
+    return detector_cls(args.feature_ms, args.head_ms, args.jitter)
+
+
+def make_corpus(sizes, count, seed=0):
+    """
+    生成合成图片（JPEG 字节）
+    参数:
+        sizes - [(width, height), ...]，按顺序循环使用
+        count - 图片数量
+    """
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        img = Image.new('RGB', (width, height), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(20):
+            x, y = rng.randrange(width), rng.randrange(height)
+            w, h = rng.randrange(8, 128), rng.randrange(8, 128)
+            color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            draw.rectangle([x, y, x + w, y + h], fill=color)
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=90)
+        corpus.append({"width": width, "height": height, "content": buffer.getvalue()})
+    return corpus
+
+
+def unique_content(content, tag):
+    """
+    在 JPEG 结束标记之后追加一段标记字节，图片解码结果不变但内容哈希不同，
+    服务端的特征缓存和缩略图缓存都不会命中
+    """
+    return content + f'loadtest:{tag}'.encode()
+
+
+def make_points(rng, width, height, count):
+    """生成随机标注点，格式与前端 ImageAnnotation 一致"""
+    labels = ['person', 'bird', 'home']
+    return [
+        {"x": rng.randrange(width), "y": rng.randrange(height), "label": rng.choice(labels), "type": "point"}
+        for _ in range(count)
+    ]
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def read_rss_mb(pid):
+    """读取进程的常驻内存（MB），只支持 Linux，读取失败返回 None"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Scenario:
+    """
+    一个虚拟客户端的请求序列
+    detect: 每次请求都上传图片和全部标注点（/api/detect）
+    session: 第一次请求创建会话，之后只发送一个标注点的移动（/api/detect/session/{id}）
+    cold 为 True 时每次上传的图片内容都不同，测量不命中服务端缓存的完整处理耗时
+    """
+
+    def __init__(self, kind, corpus, slot, points, seed, cold=False):
+        self.kind = kind
+        self.cold = cold
+        self.corpus = corpus
+        self.slot = slot
+        self.points_per_request = points
+        self.rng = random.Random(seed)
+        self.count = 0
+        self.session = None
+
+    async def request(self, client):
+        """发送一次请求，返回 HTTP 状态码"""
+        self.count += 1
+        if self.kind == 'session' and self.session is not None:
+            return await self._update_session(client)
+
+        image = self.corpus[self.rng.randrange(len(self.corpus))]
+        points = make_points(self.rng, image["width"], image["height"], self.points_per_request)
+        content = image["content"]
+        if self.cold:
+            content = unique_content(content, next(_upload_counter))
+        # 每个客户端使用固定的文件名，避免上传目录无限增长
+        files = {"file": (f"loadtest_{self.slot}.jpg", content, "image/jpeg")}
+        data = {"annotations": json.dumps(points)}
+        url = '/api/detect/session' if self.kind == 'session' else '/api/detect'
+        response = await client.post(url, files=files, data=data)
+        if self.kind == 'session' and response.status_code == 200:
+            body = response.json()
+            self.session = {"id": body["session_id"], "version": body["version"], "image": image,
+                            "size": len(points)}
+        return response.status_code
+
+    async def _update_session(self, client):
+        session = self.session
+        image = session["image"]
+        change = {"op": "add", "point": make_points(self.rng, image["width"], image["height"], 1)[0]}
+        if session["size"] > 0:
+            change = {"op": "update", "index": self.rng.randrange(session["size"]), "point": change["point"]}
+        response = await client.post(f'/api/detect/session/{session["id"]}',
+                                     json={"base_version": session["version"], "changes": [change]})
+        if response.status_code == 200:
+            session["version"] = response.json()["version"]
+            session["size"] += 1 if change["op"] == "add" else 0
+        else:
+            # 会话过期或冲突，下次重新创建
+            self.session = None
+        return response.status_code
+
+
+class Recorder:
+    """
+    记录每个请求的延迟和结果，并定期采样内存
+    rss_source 说明内存的来源: process（压测进程自身，进程内模式）或 server（服务端进程）
+    """
+
+    def __init__(self, server_pid, rss_source=None):
+        self.server_pid = server_pid
+        self.rss_source = rss_source
+        self.latencies = []
+        self.errors = 0
+        self.status_counts = {}
+        self.rss_samples = []
+
+    def record(self, latency, status):
+        key = str(status)
+        self.status_counts[key] = self.status_counts.get(key, 0) + 1
+        if status == 200:
+            self.latencies.append(latency)
+        else:
+            self.errors += 1
+
+    async def sample_memory(self, interval=0.2):
+        while True:
+            rss = read_rss_mb(self.server_pid) if self.server_pid else None
+            if rss is not None:
+                self.rss_samples.append(rss)
+            await asyncio.sleep(interval)
+
+    def summary(self, mode, level, elapsed):
+        latencies = sorted(self.latencies)
+        total = len(latencies) + self.errors
+
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            "mode": mode,
+            "level": level,
+            "requests": total,
+            "errors": self.errors,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "status_counts": self.status_counts,
+            "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": ms(percentile(latencies, 50)),
+            "p95_ms": ms(percentile(latencies, 95)),
+            "p99_ms": ms(percentile(latencies, 99)),
+            "max_ms": ms(latencies[-1] if latencies else None),
+            "rss_mb": round(self.rss_samples[-1], 1) if self.rss_samples else None,
+            "peak_rss_mb": round(max(self.rss_samples), 1) if self.rss_samples else None,
+            "rss_source": self.rss_source if self.rss_samples else None,
+        }
+
+
+async def timed_request(client, scenario, recorder, started):
+    """发送请求并记录延迟；started 为请求应当开始的时间（开环模式下为计划到达时间）"""
+    try:
+        status = await scenario.request(client)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    recorder.record(time.perf_counter() - started, status)
+
+
+async def run_closed_loop(client, args, corpus, concurrency, recorder):
+    """闭环：固定数量的客户端，每个客户端收到响应后立即发送下一个请求"""
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(slot):
+        scenario = Scenario(args.scenario, corpus, slot, args.points, args.seed + slot,
+                            args.image_cache == 'cold')
+        while time.perf_counter() < deadline:
+            await timed_request(client, scenario, recorder, time.perf_counter())
+
+    await asyncio.gather(*(worker(slot) for slot in range(concurrency)))
+
+
+async def run_open_loop(client, args, corpus, rate, recorder):
+    """
+    开环：请求按泊松过程以固定速率到达，不等待前一个请求完成
+    延迟从计划到达时间算起，服务端排队的时间也会计入
+    """
+    rng = random.Random(args.seed)
+    scenarios = [Scenario(args.scenario, corpus, slot, args.points, args.seed + slot,
+                          args.image_cache == 'cold')
+                 for slot in range(args.max_in_flight)]
+    idle = asyncio.Queue()
+    for scenario in scenarios:
+        idle.put_nowait(scenario)
+
+    async def one(scheduled):
+        scenario = await idle.get()
+        try:
+            await timed_request(client, scenario, recorder, scheduled)
+        finally:
+            idle.put_nowait(scenario)
+
+    tasks = []
+    start = time.perf_counter()
+    next_arrival = start
+    while next_arrival < start + args.duration:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(next_arrival)))
+        next_arrival += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+
+
+async def run_level(client, args, corpus, level, server_pid, rss_source=None):
+    recorder = Recorder(server_pid, rss_source)
+    sampler = asyncio.create_task(recorder.sample_memory())
+    started = time.perf_counter()
+    try:
+        if args.mode == 'closed':
+            await run_closed_loop(client, args, corpus, level, recorder)
+        else:
+            await run_open_loop(client, args, corpus, level, recorder)
+    finally:
+        sampler.cancel()
+    elapsed = time.perf_counter() - started
+    # 结束时再采样一次内存
+    rss = read_rss_mb(server_pid) if server_pid else None
+    if rss is not None:
+        recorder.rss_samples.append(rss)
+    return recorder.summary(args.mode, level, elapsed)
+
+
+def make_client(args):
+    """
+    创建 HTTP 客户端
+    指定 --url 时压测运行中的服务；否则在临时目录中导入 main 并通过 ASGI 直接调用
+    返回: (client, 采集内存的进程号, 内存来源 'server' / 'process')
+    进程内模式采集的是压测进程自身的内存，其中包含客户端和合成图片，不等同于服务端内存
+    """
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        client = httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits)
+        return client, args.server_pid, 'server'
+
+    # main 在导入时按相对路径创建 uploads 目录，切换到临时工作目录避免污染项目目录
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='loadtest_')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    app_module = importlib.import_module('main')
+
+    detector = load_detector(args.detector, args)
+    if detector is not None:
+        detector.install(app_module)
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    client = httpx.AsyncClient(transport=transport, base_url='http://loadtest', timeout=timeout)
+    return client, os.getpid(), 'process'
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_list(value, cast):
+    return [cast(v) for v in value.split(',') if v.strip()]
+
+
+def parse_sizes(value):
+    sizes = []
+    for item in value.split(','):
+        width, height = item.lower().split('x')
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def print_table(results):
+    columns = ['mode', 'level', 'requests', 'error_rate', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'rss_mb']
+    print(' '.join(f'{c:>11}' for c in columns))
+    for row in results:
+        print(' '.join(f'{str(row[c]):>11}' for c in columns))
+    sources = {row.get("rss_source") for row in results} - {None}
+    if 'process' in sources:
+        print('rss_mb 为压测进程自身的内存（进程内模式，包含客户端和合成图片），不是服务端内存')
+    elif 'server' in sources:
+        print('rss_mb 为服务端进程的内存')
+
+
+def print_comparison(results, baseline, config):
+    """按 (mode, level) 对比当前结果与之前保存的结果"""
+    previous = {(r["mode"], r["level"]): r for r in baseline["results"]}
+    print(f'\n对比 {baseline.get("commit")} -> 当前:')
+    old_cache = baseline.get("config", {}).get("image_cache")
+    if old_cache != config["image_cache"]:
+        print(f'  注意: 缓存模式不同（{old_cache} -> {config["image_cache"]}），延迟不可直接比较')
+    for row in results:
+        old = previous.get((row["mode"], row["level"]))
+        if old is None:
+            continue
+        parts = []
+        for key in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate'):
+            if old[key] in (None, 0) or row[key] is None:
+                continue
+            change = (row[key] - old[key]) / old[key] * 100
+            parts.append(f'{key} {old[key]} -> {row[key]} ({change:+.1f}%)')
+        print(f'  {row["mode"]}@{row["level"]}: ' + ', '.join(parts))
+
+
+async def main_async(args):
+    corpus = make_corpus(parse_sizes(args.image_sizes), args.images, args.seed)
+    levels = parse_list(args.concurrency, int) if args.mode == 'closed' else parse_list(args.rates, float)
+
+    client, server_pid, rss_source = make_client(args)
+    results = []
+    async with client:
+        for level in levels:
+            if args.warmup:
+                warmup_args = argparse.Namespace(**{**vars(args), "duration": args.warmup})
+                await run_level(client, warmup_args, corpus, level, None)
+            result = await run_level(client, args, corpus, level, server_pid, rss_source)
+            results.append(result)
+            print(f'{args.mode}@{level}: {result["throughput"]} req/s, p95 {result["p95_ms"]} ms, '
+                  f'错误率 {result["error_rate"]}')
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='检测接口压力测试')
+    parser.add_argument('--url', help='压测运行中的服务，例如 http://localhost:8000；不指定则进程内通过 ASGI 调用')
+    parser.add_argument('--server-pid', type=int, help='服务端进程号，用于采集内存（仅 --url 模式需要）')
+    parser.add_argument('--workdir', help='进程内模式的工作目录，不存在时自动创建，默认新建临时目录')
+    parser.add_argument('--scenario', choices=['detect', 'session'], default='detect',
+                        help='detect: 每次上传图片；session: 创建会话后只发送标注点变化')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed', help='闭环或开环')
+    parser.add_argument('--concurrency', default=DEFAULT_CONCURRENCY, help='闭环模式的并发级别，逗号分隔')
+    parser.add_argument('--rates', default=DEFAULT_RATES, help='开环模式的请求速率（请求/秒），逗号分隔')
+    parser.add_argument('--max-in-flight', type=int, default=64, help='开环模式同时进行的最大请求数')
+    parser.add_argument('--duration', type=float, default=10.0, help='每个级别的持续时间（秒）')
+    parser.add_argument('--warmup', type=float, default=0.0, help='每个级别开始前的预热时间（秒），不计入结果')
+    parser.add_argument('--timeout', type=float, default=30.0, help='单个请求超时（秒）')
+    parser.add_argument('--images', type=int, default=8, help='合成图片数量')
+    parser.add_argument('--image-cache', choices=['cold', 'warm'], default='cold',
+                        help='cold: 每次上传的图片内容都不同，不命中服务端的特征和缩略图缓存；'
+                             'warm: 重复上传合成图片，测量缓存命中时的耗时')
+    parser.add_argument('--image-sizes', default=DEFAULT_IMAGE_SIZES, help='合成图片尺寸，例如 640x480,2048x1536')
+    parser.add_argument('--points', type=int, default=5, help='每个请求的标注点数量')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，保证多次运行的负载一致')
+    parser.add_argument('--detector', default='app',
+                        help='进程内模式的检测器: app（应用自带）、fake 或 module:Class')
+    parser.add_argument('--feature-ms', type=float, default=150.0, help='假检测器的特征提取耗时（毫秒）')
+    parser.add_argument('--head-ms', type=float, default=50.0, help='假检测器的检测头耗时（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='假检测器耗时的随机浮动比例')
+    parser.add_argument('--output', help='结果保存路径（JSON）')
+    parser.add_argument('--compare', help='与之前保存的结果（JSON）对比')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # 输出/对比文件按启动时的目录解析（进程内模式会切换工作目录）
+    output = os.path.abspath(args.output) if args.output else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    results = asyncio.run(main_async(args))
+
+    print()
+    print_table(results)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'workdir')},
+        "results": results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'\n结果已保存到: {output}')
+    if compare:
+        with open(compare) as f:
+            print_comparison(results, json.load(f), report["config"])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,55 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse
+from pydantic import BaseModel
+from PIL import Image
 
 import os
 import json
+import math
 import asyncio
 from pathlib import Path
-import base64
 from typing import Optional
 
+from image_pyramid import ImagePyramid, FULL_LEVEL
+from annotation_index import AnnotationIndexFile
+from detection_session import (LRUCache, SessionStore, VersionConflict,
+                               FEATURE_CACHE_SIZE, validate_points)
+
+# 模拟的图像特征提取 - 对应模型中只依赖图片的部分（如 backbone），耗时最多
+async def extract_image_features(image_path: str):
+    """
+    这是一个示例函数，您需要根据实际的PyTorch项目来替换
+    参数:
+        image_path - 图片文件路径
+    返回: 图像特征，会按图片内容哈希缓存，标注点变化时复用
+    """
+    # 模拟特征提取延迟
+    await asyncio.sleep(1.5)
+
+    with Image.open(image_path) as img:
+        width, height = img.size
+    return {"width": width, "height": height}
+
 # 模拟的检测函数 - 您需要替换为实际的PyTorch检测函数调用
-async def run_detection(image_path: str, annotations: list = None):
+async def run_detection(image_path: str, annotations: list = None, features: dict = None):
     """
     这是一个示例函数，您需要根据实际的PyTorch项目来替换
     参数:
         image_path - 图片文件路径
         annotations - 标注点列表 [{"x": 100, "y": 200, "label": "点1"}, ...]
+        features - extract_image_features 的结果，为空时重新提取
     返回: 检测结果字典，包含边界框、标签、置信度等信息
 
     实际使用时，您可能需要这样调用:
     import your_detection_module
     result = your_detection_module.run_detection(image_path, annotations)
     """
-    # 模拟检测延迟
-    await asyncio.sleep(2)
+    if features is None:
+        features = await extract_image_features(image_path)
+
+    # 模拟依赖标注点部分（检测头）的延迟
+    await asyncio.sleep(0.5)
 
     # 如果有标注点，在日志中打印（实际使用时传给模型）
     if annotations:
@@ -33,7 +59,7 @@ async def run_detection(image_path: str, annotations: list = None):
 
     # 保存检测结果为指定格式的txt文件
     with open("uploads/label/00006.txt", "w") as f:
-        for i, ann in enumerate(annotations):
+        for i, ann in enumerate(annotations or []):
             
             # 按照指定格式写入文件：
             # x1 y1 x2 y2 x3 y3 x4 y4 point_x point_y class_name difficulty
@@ -96,6 +122,54 @@ async def read_items():
 # 创建图片保存目录
 IMAGE_DIR = Path("uploads/images")
 IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+# run_detection 写入的点标注目录
+Path("uploads/label").mkdir(parents=True, exist_ok=True)
+
+# 图片金字塔缓存（缩略图按内容哈希存放，可长期缓存）
+PYRAMID_DIR = Path("uploads/pyramid")
+image_pyramid = ImagePyramid(PYRAMID_DIR)
+PYRAMID_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# COCO 标注索引（PointLabel2COCO 的输出文件，文件更新后自动重建）
+COCO_LABEL_FILE = Path("uploads/coco_format_point_labels.json")
+annotation_index = AnnotationIndexFile(COCO_LABEL_FILE)
+
+# /api/detect 的图像特征缓存（按图片内容哈希）和增量检测会话（会话各自保存特征）
+feature_cache = LRUCache(FEATURE_CACHE_SIZE)
+detection_sessions = SessionStore()
+
+
+async def get_image_features(image_id: str):
+    """
+    获取图像特征，优先使用缓存
+    缓存未命中时从按内容哈希存放的原图副本提取，保证特征与 image_id 对应的图片一致；
+    图片未登记或副本已被删除时抛出 KeyError / FileNotFoundError
+    """
+    features = feature_cache.get(image_id)
+    if features is None:
+        image_path = image_pyramid.level_path(image_id, FULL_LEVEL)
+        features = await extract_image_features(str(image_path))
+        feature_cache.put(image_id, features)
+    return features
+
+
+def pyramid_response(meta: dict) -> dict:
+    """为金字塔元数据补充各级别的访问地址"""
+    image_id = meta["image_id"]
+    return {
+        "image_id": image_id,
+        "width": meta["width"],
+        "height": meta["height"],
+        "levels": [
+            {
+                "level": item["level"],
+                "width": item["width"],
+                "height": item["height"],
+                "url": f"/api/images/{image_id}/pyramid/{item['level']}",
+            }
+            for item in meta["levels"]
+        ],
+    }
 
 @app.post("/upload/avatar/")
 async def upload_avatar(file: UploadFile = File(...)):
@@ -137,54 +211,242 @@ async def detect_objects(
         raise HTTPException(status_code=400, detail="只支持图片文件")
 
     try:
-        # 保存上传的图片
-        # file_extension = file.filename.split('.')[-1] if file.filename else 'jpg'
-        # safe_filename = f"detect_{hash(file.filename or 'image')}.{file_extension}" 
-        file_path = IMAGE_DIR / file.filename
+        image_path, pyramid = await save_upload(file)
+        annotation_data = parse_annotations(annotations)
 
-        # 读取并保存文件
-        content = await file.read()
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
-
-        # 解析标注数据
-        annotation_data = None
-        if annotations:
-            try:
-                annotation_data = json.loads(annotations)
-                print(f"✓ 接收到标注数据: {len(annotation_data)} 个标注点")
-            except json.JSONDecodeError:
-                print("⚠ 标注数据解析失败，将不使用标注数据")
-                annotation_data = None
-
-        # 调用检测函数，传入标注数据
-        detection_result = await run_detection(str(file_path), annotation_data)
-
-        # 读取图片并转换为base64（用于前端显示）
-        with open(file_path, "rb") as img_file:
-            img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
+        # 调用检测函数，传入标注数据（同一张图片的特征会复用缓存）
+        features = await get_image_features(pyramid["image_id"])
+        detection_result = await run_detection(str(image_path), annotation_data, features)
 
         # 清理临时文件（可选）
         # os.remove(file_path)
 
-        return {
-            "success": True,
-            "filename": file.filename,
-            "image_base64": f"data:image/{file.filename};base64,{img_base64}",
-            "detections": detection_result["detections"],
-            "image_width": detection_result["image_width"],
-            "image_height": detection_result["image_height"],
-            "detection_count": len(detection_result["detections"]),
-            "annotations_used": detection_result.get("used_annotations", 0)
-        }
+        return detection_response(file.filename, pyramid, detection_result)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"检测失败: {str(e)}")
+
+async def save_upload(file: UploadFile):
+    """
+    保存上传的图片并生成缩略图金字塔
+    返回: (按内容哈希存放的原图副本路径, 金字塔元数据)
+    上传目录中的文件可能被之后的同名上传覆盖，检测应使用返回的副本路径
+    """
+    # 保存上传的图片
+    # file_extension = file.filename.split('.')[-1] if file.filename else 'jpg'
+    # safe_filename = f"detect_{hash(file.filename or 'image')}.{file_extension}" 
+    file_path = IMAGE_DIR / file.filename
+
+    # 读取并保存文件
+    content = await file.read()
+    with open(file_path, "wb") as buffer:
+        buffer.write(content)
+
+    # 生成缩略图金字塔（用于前端显示，替代整张图片的base64）
+    pyramid = await asyncio.to_thread(image_pyramid.register, file_path, content)
+    return Path(pyramid["source"]), pyramid
+
+def parse_annotations(annotations: Optional[str]):
+    """解析 JSON 字符串格式的标注数据，解析失败时返回 None"""
+    if not annotations:
+        return None
+    try:
+        annotation_data = json.loads(annotations)
+        print(f"✓ 接收到标注数据: {len(annotation_data)} 个标注点")
+        return annotation_data
+    except json.JSONDecodeError:
+        print("⚠ 标注数据解析失败，将不使用标注数据")
+        return None
+
+def detection_response(filename: str, pyramid: dict, detection_result: dict) -> dict:
+    """组装检测接口的返回数据"""
+    return {
+        "success": True,
+        "filename": filename,
+        "image_id": pyramid["image_id"],
+        "pyramid": pyramid_response(pyramid),
+        "detections": detection_result["detections"],
+        "image_width": detection_result["image_width"],
+        "image_height": detection_result["image_height"],
+        "detection_count": len(detection_result["detections"]),
+        "annotations_used": detection_result.get("used_annotations", 0)
+    }
+
+@app.post("/api/detect/session")
+async def create_detection_session(
+    file: UploadFile = File(...),
+    annotations: Optional[str] = Form(None)
+):
+    """
+    创建增量检测会话
+    图片只在这里上传一次，之后通过 /api/detect/session/{session_id} 只提交标注点的变化
+
+    参数:
+        file: 图片文件
+        annotations: JSON字符串格式的初始标注数据（可选）
+    """
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="只支持图片文件")
+
+    try:
+        annotation_data = validate_points(parse_annotations(annotations) or [])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"标注数据无效: {e}")
+
+    try:
+        image_path, pyramid = await save_upload(file)
+        features = await get_image_features(pyramid["image_id"])
+        detection_result = await run_detection(str(image_path), annotation_data, features)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"检测失败: {str(e)}")
+
+    # 首次检测成功后才创建会话，失败时不留下无用的会话
+    session = detection_sessions.create(pyramid["image_id"], file.filename, annotation_data, features)
+    result = detection_response(file.filename, pyramid, detection_result)
+    result["session_id"] = session.session_id
+    result["version"] = session.version
+    return result
+
+class PointChanges(BaseModel):
+    """
+    标注点变化
+    base_version: 客户端当前持有的会话版本
+    changes: [{"op": "add", "point": {...}}, {"op": "update", "index": 0, "point": {...}},
+              {"op": "remove", "index": 0}]，按顺序应用
+    """
+    base_version: int
+    changes: list[dict]
+
+@app.post("/api/detect/session/{session_id}")
+async def update_detection_session(session_id: str, body: PointChanges):
+    """
+    提交标注点的变化并重新检测，复用会话图片的缓存特征
+    会话不存在（已过期被淘汰或图片缓存已删除）返回 404，版本不一致返回 409，客户端应重新创建会话；
+    标注点无效返回 400、检测失败返回 500，这两种情况会话版本不变，客户端可以直接重试
+    """
+    try:
+        session = detection_sessions.get(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="检测会话不存在或已过期")
 
+    try:
+        points = session.prepare(body.base_version, body.changes)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=f"标注点版本不一致，{e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"标注点变化无效: {e}")
+
+    try:
+        pyramid = image_pyramid.get_meta(session.image_id)
+        image_path = image_pyramid.level_path(session.image_id, FULL_LEVEL)
+    except (KeyError, FileNotFoundError):
+        detection_sessions.remove(session_id)
+        raise HTTPException(status_code=404, detail="会话图片已失效，请重新上传")
+
+    try:
+        # 特征随会话保存，不受 /api/detect 特征缓存淘汰的影响
+        features = session.features
+        if features is None:
+            features = await get_image_features(session.image_id)
+            session.features = features
+        detection_result = await run_detection(str(image_path), points, features)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"检测失败: {str(e)}")
 
+    # 检测成功后才更新会话版本
+    try:
+        version = session.commit(body.base_version, points)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=f"标注点版本不一致，{e}")
+
+    result = detection_response(session.filename, pyramid, detection_result)
+    result["session_id"] = session.session_id
+    result["version"] = version
+    return result
+
+@app.delete("/api/detect/session/{session_id}")
+async def delete_detection_session(session_id: str):
+    """结束检测会话"""
+    detection_sessions.remove(session_id)
+    return {"success": True}
+
 @app.get("/api/detection/status")
 async def get_detection_status():
     """获取检测服务状态"""
     return {
         "status": "ready",
         "message": "图像检测服务运行正常"
-    }
\ No newline at end of file
+    }
+
+@app.get("/api/images/{image_id}/pyramid")
+async def get_image_pyramid(image_id: str):
+    """获取图片金字塔的各级别尺寸和访问地址"""
+    try:
+        meta = image_pyramid.get_meta(image_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    return pyramid_response(meta)
+
+@app.get("/api/images/{image_id}/pyramid/{level}")
+async def get_image_pyramid_level(image_id: str, level: str):
+    """
+    获取指定级别的图片
+    level 为 256 / 1024 / full；地址按内容哈希区分，浏览器可长期缓存
+    """
+    try:
+        path = image_pyramid.level_path(image_id, level)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="图片或级别不存在")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="原图已被替换或删除")
+
+    headers = {"Cache-Control": PYRAMID_CACHE_CONTROL}
+    if level == FULL_LEVEL:
+        return FileResponse(path, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+def get_annotation_index():
+    try:
+        return annotation_index.get()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="标注文件不存在，请先生成COCO格式标注")
+
+@app.get("/api/annotations")
+async def query_annotations(
+    image: Optional[str] = None,
+    category: Optional[str] = None,
+    bbox: Optional[str] = None
+):
+    """
+    查询标注
+    参数:
+        image: 图片ID或文件名（可选）
+        category: 类别ID或名称（可选）
+        bbox: 区域 "x_min,y_min,x_max,y_max"（可选）。带 point 的标注（点标注）按点是否落在区域内过滤，
+              其 bbox 只是围绕点生成的固定大小框，不参与过滤；没有 point 的标注按 bbox 是否与区域相交过滤
+    """
+    region = None
+    if bbox:
+        try:
+            region = tuple(float(v) for v in bbox.split(","))
+        except ValueError:
+            region = ()
+        if (len(region) != 4 or not all(math.isfinite(v) for v in region)
+                or region[0] > region[2] or region[1] > region[3]):
+            raise HTTPException(status_code=400, detail="bbox 格式应为 x_min,y_min,x_max,y_max")
+
+    index = await asyncio.to_thread(get_annotation_index)
+    try:
+        results = await asyncio.to_thread(index.query, image=image, category=category, bbox=region)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "count": len(results),
+        "annotations": results
+    }
+
+@app.get("/api/annotations/stats")
+async def get_annotation_stats():
+    """获取数据集统计信息（每个类别的数量和尺寸分布）"""
+    index = await asyncio.to_thread(get_annotation_index)
+    return index.stats()
@@ -1,9 +1,7 @@
 import dota_utils as util
+from file_discovery import get_image_index, IMAGE_EXTENSIONS
 import os
-import cv2
-import json
-from PIL import Image
-import shutil
+# json / PIL / shutil 在用到的函数中导入，导入本模块（例如从 API 或命令行）时不加载图像库
 
 # wordname_1 = ['bridge']
 wordname_15 = ['plane', 'baseball-diamond', 'bridge', 'ground-track-field', 'small-vehicle', 'large-vehicle', 'ship', 'tennis-court',
@@ -22,54 +20,89 @@ word_name_dior_all = ['door', 'chair', 'table']
 # 自定义类别列表，根据实际数据调整
 custom_categories = ['person', 'bird', 'home']
 
-def DOTA2COCOTrain(srcpath, destfile, cls_names, difficult='2'):
+# EXIF 方向标签，取值 5~8 表示图片需要旋转 90°/270°
+EXIF_ORIENTATION = 0x0112
+
+def read_image_size(imagepath):
+    """
+    读取图片尺寸 (width, height)，只解析文件头，不解码整张图片
+    尺寸按 EXIF 方向旋转后计算，与 cv2.imread 读出的图片一致
+    无法读取时返回 None
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(imagepath) as img:
+            width, height = img.size
+            if img.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                width, height = height, width
+            return width, height
+    except OSError:
+        return None
+
+def DOTA2COCOTrain(srcpath, destfile, cls_names, difficult='2',
+                   label_dir='label', image_exts=IMAGE_EXTENSIONS, unmatched_dir=None):
+    """
+    将带旋转框和点的训练标注转换为COCO格式
+    Args:
+        srcpath: 数据源路径
+        destfile: 输出JSON文件路径
+        cls_names: 类别名称列表
+        label_dir: 标注目录名，DIOR 为 'label'，DOTA 为 'labelTxt_obb_pt_trainval_viaobb_v1.0'
+        image_exts: 图片扩展名，同名时按顺序优先
+        unmatched_dir: 找不到图片的标注文件移动到此目录（例如 DIOR 的测试集），为空时跳过
+    """
+    import json
 
-    # DIOR
     imageparent = os.path.join(srcpath, 'images')  
-    labelparent = os.path.join(srcpath, 'label')
-    # # DOTA
-    # imageparent = os.path.join(srcpath, 'images')
-    # labelparent = os.path.join(srcpath, 'labelTxt_obb_pt_trainval_viaobb_v1.0')
+    labelparent = os.path.join(srcpath, label_dir)
 
     data_dict = {}
     data_dict['images'] = []
     data_dict['categories'] = []
     data_dict['annotations'] = []
+    cat_ids = {}
     for idex, name in enumerate(cls_names):
         single_cat = {'id': idex + 1, 'name': name, 'supercategory': name}
         data_dict['categories'].append(single_cat)
+        cat_ids[name] = idex + 1
 
     inst_count = 1
     image_id = 1
     with open(destfile, 'w') as f_out:
-        filenames = util.GetFileFromThisRootDir(labelparent)
+        image_index = get_image_index(imageparent, image_exts)
+        filenames = util.GetFileFromThisRootDir(labelparent, 'txt')
         for file in filenames:
+            # 扩展名不区分大小写（a.TXT 也会列出），读取和移动都使用遍历得到的实际路径
             basename = util.custombasename(file)
-            basetxtname = basename + '.txt'
-            txt_path = os.path.join(labelparent, basetxtname)
             # image_id = int(basename[1:])
 
-            # imagepath = os.path.join(imageparent, basename + '.png') # DOTA
-            imagepath = os.path.join(imageparent, basename + '.jpg')  # DIOR
+            imagepath = image_index.get(basename)
 
-            if not os.path.exists(imagepath):  # move testset in DIOR
-                shutil.move(txt_path, os.path.join('DIOR/labelTxt_obb_pt_test/', basetxtname))
+            if imagepath is None:
+                if unmatched_dir:  # move testset in DIOR
+                    import shutil
+                    os.makedirs(unmatched_dir, exist_ok=True)
+                    shutil.move(file, os.path.join(unmatched_dir, os.path.basename(file)))
+                else:
+                    print(f"Warning: No image found for {basename}")
                 continue
 
-            img = cv2.imread(imagepath)
-            height, width, c = img.shape
+            size = read_image_size(imagepath)
+            if size is None:
+                print(f"Warning: Cannot read image {imagepath}")
+                continue
+            width, height = size
 
             single_image = {}
-            # single_image['file_name'] = basename + '.png'  # DOTA
-            single_image['file_name'] = basename + '.jpg'  # DIOR
+            single_image['file_name'] = os.path.basename(imagepath)
             single_image['id'] = image_id
             single_image['width'] = width
             single_image['height'] = height
             data_dict['images'].append(single_image)
 
             # annotations
-            txtpath = os.path.join(labelparent, basetxtname)
-            with open(txtpath, 'r') as f_in:
+            with open(file, 'r') as f_in:
                 lines = f_in.readlines()
                 splitlines = [x.strip().split(' ') for x in lines]
                 boxes = []
@@ -89,10 +122,10 @@ def DOTA2COCOTrain(srcpath, destfile, cls_names, difficult='2'):
                     class_name = splitline[10]
                     # class_name = class_name.lower() # DIOR
                     difficulty = splitline[11]
-                    assert class_name in cls_names
+                    assert class_name in cat_ids
 
                     single_obj = {}
-                    single_obj['category_id'] = cls_names.index(class_name) + 1
+                    single_obj['category_id'] = cat_ids[class_name]
                     single_obj['segmentation'] = []
                     single_obj['segmentation'].append([x1,y1,x2,y2,x3,y3,x4,y4])
                     single_obj['iscrowd'] = 0
@@ -124,7 +157,17 @@ def DOTA2COCOTrain(srcpath, destfile, cls_names, difficult='2'):
         json.dump(data_dict, f_out)
         print('done!')
 
-def DOTA2COCOTest(srcpath, destfile, cls_names):
+def DOTA2COCOTest(srcpath, destfile, cls_names, image_exts=IMAGE_EXTENSIONS):
+    """
+    生成只包含图片信息的测试集COCO文件
+    Args:
+        srcpath: 数据源路径
+        destfile: 输出JSON文件路径
+        cls_names: 类别名称列表
+        image_exts: 图片扩展名
+    """
+    import json
+
     imageparent = os.path.join(srcpath, 'images')
     data_dict = {}
 
@@ -136,16 +179,15 @@ def DOTA2COCOTest(srcpath, destfile, cls_names):
 
     image_id = 1
     with open(destfile, 'w') as f_out:
-        filenames = util.GetFileFromThisRootDir(imageparent)
-        for file in filenames:
-            basename = util.custombasename(file)
-            imagepath = os.path.join(imageparent, basename + '.png')
-            img = Image.open(imagepath)
-            height = img.height
-            width = img.width
+        for file in util.iter_files(imageparent, image_exts):
+            size = read_image_size(file)
+            if size is None:
+                print(f"Warning: Cannot read image {file}")
+                continue
+            width, height = size
 
             single_image = {}
-            single_image['file_name'] = basename + '.png'
+            single_image['file_name'] = os.path.basename(file)
             single_image['id'] = image_id
             single_image['width'] = width
             single_image['height'] = height
@@ -155,14 +197,17 @@ def DOTA2COCOTest(srcpath, destfile, cls_names):
         json.dump(data_dict, f_out)
 
 # 新增函数：专门处理模型推理时的点标注数据
-def PointLabel2COCO(srcpath, destfile, cls_names):
+def PointLabel2COCO(srcpath, destfile, cls_names, image_exts=IMAGE_EXTENSIONS):
     """
     将点标注数据转换为COCO格式
     Args:
         srcpath: 数据源路径
         destfile: 输出JSON文件路径
         cls_names: 类别名称列表
+        image_exts: 图片扩展名，同名时按顺序优先
     """
+    import json
+
     imageparent = os.path.join(srcpath, 'images')  
     labelparent = os.path.join(srcpath, 'label')
     
@@ -172,39 +217,36 @@ def PointLabel2COCO(srcpath, destfile, cls_names):
     data_dict['annotations'] = []
     
     # 创建类别信息
+    cat_ids = {}
     for idex, name in enumerate(cls_names):
         single_cat = {'id': idex + 1, 'name': name, 'supercategory': name}
         data_dict['categories'].append(single_cat)
+        cat_ids[name] = idex + 1
 
     inst_count = 1
     image_id = 1
     
     with open(destfile, 'w') as f_out:
-        filenames = util.GetFileFromThisRootDir(labelparent)
-        
-        for file in filenames:
+        # 一次遍历图片目录建立 文件名 -> 图片路径 索引（支持多种格式）
+        image_index = get_image_index(imageparent, image_exts)
+
+        for file in util.iter_files(labelparent, 'txt'):
             basename = util.custombasename(file)
             
-            # 查找对应的图像文件（支持多种格式）
-            image_extensions = ['.jpg', '.jpeg', '.png', '.bmp']
-            imagepath = None
-            for ext in image_extensions:
-                potential_path = os.path.join(imageparent, basename + ext)
-                if os.path.exists(potential_path):
-                    imagepath = potential_path
-                    break
+            # 查找对应的图像文件
+            imagepath = image_index.get(basename)
             
             if not imagepath:
                 print(f"Warning: No image found for {basename}")
                 continue
 
-            # 读取图像获取尺寸
-            img = cv2.imread(imagepath)
-            if img is None:
+            # 读取图像获取尺寸（只读文件头）
+            size = read_image_size(imagepath)
+            if size is None:
                 print(f"Warning: Cannot read image {imagepath}")
                 continue
                 
-            height, width, c = img.shape
+            width, height = size
 
             # 添加图像信息
             single_image = {}
@@ -214,13 +256,8 @@ def PointLabel2COCO(srcpath, destfile, cls_names):
             single_image['height'] = height
             data_dict['images'].append(single_image)
 
-            # 处理标注文件
-            txtpath = os.path.join(labelparent, basename + '.txt')
-            if not os.path.exists(txtpath):
-                print(f"Warning: No label file found for {basename}")
-                continue
-                
-            with open(txtpath, 'r') as f_in:
+            # 处理标注文件（使用遍历得到的实际路径，扩展名可能是大写）
+            with open(file, 'r') as f_in:
                 lines = f_in.readlines()
                 
                 for i, line in enumerate(lines):
@@ -245,13 +282,13 @@ def PointLabel2COCO(srcpath, destfile, cls_names):
                     difficulty = splitline[11] if len(splitline) > 11 else '0'
                     
                     # 检查类别是否在类别列表中
-                    if class_name not in cls_names:
+                    if class_name not in cat_ids:
                         print(f"Warning: Unknown class '{class_name}' in {basename}")
                         continue
 
                     # 创建标注对象
                     single_obj = {}
-                    single_obj['category_id'] = cls_names.index(class_name) + 1
+                    single_obj['category_id'] = cat_ids[class_name]
                     single_obj['segmentation'] = []
                     single_obj['segmentation'].append([x1, y1, x2, y2, x3, y3, x4, y4])
                     single_obj['iscrowd'] = 0
@@ -286,7 +323,58 @@ def PointLabel2COCO(srcpath, destfile, cls_names):
         json.dump(data_dict, f_out, indent=2)
         print(f'Conversion completed! Output saved to: {destfile}')
 
+def MergeCOCO(srcfiles, destfile):
+    """
+    合并多个COCO格式文件
+    类别按名称合并，图片和标注的ID重新编号
+    Args:
+        srcfiles: 输入JSON文件路径列表
+        destfile: 输出JSON文件路径
+    """
+    import json
+
+    data_dict = {}
+    data_dict['images'] = []
+    data_dict['categories'] = []
+    data_dict['annotations'] = []
+    cat_ids = {}
+
+    image_id = 1
+    inst_count = 1
+    for srcfile in srcfiles:
+        with open(srcfile, 'r') as f_in:
+            src = json.load(f_in)
+
+        # 原类别ID -> 合并后的类别ID
+        cat_map = {}
+        for cat in src.get('categories', []):
+            name = cat['name']
+            if name not in cat_ids:
+                cat_ids[name] = len(cat_ids) + 1
+                data_dict['categories'].append({'id': cat_ids[name], 'name': name,
+                                                'supercategory': cat.get('supercategory', name)})
+            cat_map[cat['id']] = cat_ids[name]
+
+        # 原图片ID -> 合并后的图片ID
+        image_map = {}
+        for img in src.get('images', []):
+            image_map[img['id']] = image_id
+            data_dict['images'].append({**img, 'id': image_id})
+            image_id += 1
+
+        for ann in src.get('annotations', []):
+            data_dict['annotations'].append({**ann, 'id': inst_count,
+                                             'image_id': image_map[ann['image_id']],
+                                             'category_id': cat_map[ann['category_id']]})
+            inst_count += 1
+        print(f'Merged: {srcfile}')
+
+    with open(destfile, 'w') as f_out:
+        json.dump(data_dict, f_out)
+    print(f'Merge completed! Output saved to: {destfile}')
+
 if __name__ == '__main__':
+    # 命令行参数见 dota2coco_cli.py；直接运行本文件时按下面的默认配置转换
     # DOTA2COCOTrain(r'DOTAv10/data/split_ss_dota_1024_200/trainval/',
     #                r'DOTAv10/data/split_ss_dota_1024_200/trainval/trainval_1024_P2Bfmt_dotav10_rbox.json',
     #                wordname_15)
@@ -1,9 +1,12 @@
 import { useState, useRef, useEffect } from 'react'
 import './ImageAnnotation.css'
 
-const ImageAnnotation = ({ imageUrl, onAnnotationsChange, initialAnnotations = [] }) => {
+// imageWidth / imageHeight: 原图尺寸。imageUrl 为金字塔缩略图时传入，
+// 标注坐标始终按原图像素计算，不传则使用图片本身的尺寸
+const ImageAnnotation = ({ imageUrl, onAnnotationsChange, initialAnnotations = [], imageWidth, imageHeight }) => {
   const canvasRef = useRef(null)
   const containerRef = useRef(null)
+  const imageRef = useRef(null)
   const [annotations, setAnnotations] = useState(initialAnnotations)
   const [selectedPointIndex, setSelectedPointIndex] = useState(null)
   const [isDragging, setIsDragging] = useState(false)
@@ -17,10 +20,13 @@ const ImageAnnotation = ({ imageUrl, onAnnotationsChange, initialAnnotations = [
     const img = new Image()
     img.src = imageUrl
     img.onload = () => {
-      setImageSize({ width: img.width, height: img.height })
-      resizeCanvas(img.width, img.height)
+      imageRef.current = img
+      const width = imageWidth || img.width
+      const height = imageHeight || img.height
+      setImageSize({ width, height })
+      resizeCanvas(width, height)
     }
-  }, [imageUrl])
+  }, [imageUrl, imageWidth, imageHeight])
 
   // 调整画布大小以适应容器
   const resizeCanvas = (imgWidth, imgHeight) => {
@@ -57,28 +63,25 @@ const ImageAnnotation = ({ imageUrl, onAnnotationsChange, initialAnnotations = [
     return () => window.removeEventListener('resize', handleResize)
   }, [imageSize])
 
-  // 绘制画布
+  // 绘制画布（复用已加载的图片，不在每次重绘时重新解码）
   useEffect(() => {
     const canvas = canvasRef.current
-    if (!canvas || !imageUrl) return
+    const img = imageRef.current
+    if (!canvas || !img) return
 
     const ctx = canvas.getContext('2d')
-    const img = new Image()
-    img.src = imageUrl
 
-    img.onload = () => {
-      // 清空画布
-      ctx.clearRect(0, 0, canvas.width, canvas.height)
+    // 清空画布
+    ctx.clearRect(0, 0, canvas.width, canvas.height)
 
-      // 绘制图片
-      ctx.drawImage(img, 0, 0, canvas.width, canvas.height)
+    // 绘制图片
+    ctx.drawImage(img, 0, 0, canvas.width, canvas.height)
 
-      // 绘制所有标注点
-      annotations.forEach((point, index) => {
-        drawPoint(ctx, point, index === selectedPointIndex)
-      })
-    }
-  }, [imageUrl, annotations, selectedPointIndex, canvasSize])
+    // 绘制所有标注点
+    annotations.forEach((point, index) => {
+      drawPoint(ctx, point, index === selectedPointIndex)
+    })
+  }, [imageSize, annotations, selectedPointIndex, canvasSize])
 
   // 绘制单个标注点
   const drawPoint = (ctx, point, isSelected) => {
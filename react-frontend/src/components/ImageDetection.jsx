@@ -1,6 +1,7 @@
 import { useState } from 'react'
 import axios from 'axios'
 import ImageAnnotation from './ImageAnnotation'
+import { pickPyramidLevel } from '../utils/pyramid'
 import './ImageDetection.css'
 
 const ImageDetection = () => {
@@ -11,6 +12,8 @@ const ImageDetection = () => {
   const [error, setError] = useState(null)
   const [annotations, setAnnotations] = useState([])
   const [showAnnotation, setShowAnnotation] = useState(false)
+  // 增量检测会话：图片只上传一次，之后只提交标注点的变化
+  const [session, setSession] = useState(null)
 
   // 处理文件选择
   const handleFileSelect = (event) => {
@@ -20,6 +23,7 @@ const ImageDetection = () => {
       setDetectionResult(null)
       setError(null)
       setAnnotations([])
+      setSession(null)
 
       // 生成预览
       const reader = new FileReader()
@@ -40,6 +44,7 @@ const ImageDetection = () => {
       setDetectionResult(null)
       setError(null)
       setAnnotations([])
+      setSession(null)
 
       const reader = new FileReader()
       reader.onload = (e) => {
@@ -67,22 +72,20 @@ const ImageDetection = () => {
     setError(null)
 
     try {
-      const formData = new FormData()
-      formData.append('file', selectedFile)
-
-      // 添加标注数据
-      if (annotations.length > 0) {
-        formData.append('annotations', JSON.stringify(annotations))
+      let result = null
+      if (session) {
+        result = await updateSession()
+      }
+      if (!result) {
+        result = await createSession()
       }
 
-      const response = await axios.post('/api/detect', formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        },
-        timeout: 30000 // 30秒超时
+      setSession({
+        id: result.session_id,
+        version: result.version,
+        annotations: annotations
       })
-
-      setDetectionResult(response.data)
+      setDetectionResult(result)
       setShowAnnotation(false)
     } catch (err) {
       console.error('检测失败:', err)
@@ -92,6 +95,43 @@ const ImageDetection = () => {
     }
   }
 
+  // 上传图片并创建检测会话
+  const createSession = async () => {
+    const formData = new FormData()
+    formData.append('file', selectedFile)
+
+    // 添加标注数据
+    if (annotations.length > 0) {
+      formData.append('annotations', JSON.stringify(annotations))
+    }
+
+    const response = await axios.post('/api/detect/session', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+      timeout: 30000 // 30秒超时
+    })
+    return response.data
+  }
+
+  // 只提交标注点的变化；会话过期或版本不一致时返回 null，由调用方重新创建会话
+  const updateSession = async () => {
+    try {
+      const response = await axios.post(`/api/detect/session/${session.id}`, {
+        base_version: session.version,
+        changes: diffAnnotations(session.annotations, annotations)
+      }, {
+        timeout: 30000
+      })
+      return response.data
+    } catch (err) {
+      if (err.response?.status === 404 || err.response?.status === 409) {
+        return null
+      }
+      throw err
+    }
+  }
+
   // 标注数据变化回调
   const handleAnnotationsChange = (newAnnotations) => {
     setAnnotations(newAnnotations)
@@ -105,6 +145,10 @@ const ImageDetection = () => {
     setError(null)
     setAnnotations([])
     setShowAnnotation(false)
+    if (session) {
+      axios.delete(`/api/detect/session/${session.id}`).catch(() => {})
+    }
+    setSession(null)
   }
 
   return (
@@ -131,8 +175,11 @@ const ImageDetection = () => {
               </button>
             </div>
           </div>
+          {/* 调整标注点时已有金字塔，用缩略图显示，标注坐标按原图尺寸换算 */}
           <ImageAnnotation
-            imageUrl={preview}
+            imageUrl={detectionResult?.pyramid ? getResultImageUrl(detectionResult.pyramid) : preview}
+            imageWidth={detectionResult?.pyramid?.width}
+            imageHeight={detectionResult?.pyramid?.height}
             onAnnotationsChange={handleAnnotationsChange}
             initialAnnotations={annotations}
           />
@@ -224,9 +271,14 @@ const ImageDetection = () => {
             <div className="detection-results">
               <div className="results-header">
                 <h3>✨ 检测结果</h3>
-                <button onClick={clearResults} className="btn-new-detection">
-                  🔄 新检测
-                </button>
+                <div className="results-actions">
+                  <button onClick={startAnnotation} className="btn-new-detection">
+                    📍 调整标注点
+                  </button>
+                  <button onClick={clearResults} className="btn-new-detection">
+                    🔄 新检测
+                  </button>
+                </div>
               </div>
               <div className="results-summary">
                 <div className="summary-item">
@@ -245,7 +297,8 @@ const ImageDetection = () => {
               <div className="annotated-image-container">
                 <div className="image-canvas-wrapper">
                   <img
-                    src={detectionResult.image_base64}
+                    src={getResultImageUrl(detectionResult.pyramid)}
+                    width={detectionResult.pyramid.width}
                     alt="检测结果"
                     className="result-image"
                   />
@@ -321,6 +374,34 @@ const ImageDetection = () => {
   )
 }
 
+// 计算两次提交之间标注点的变化（按索引比较）
+const diffAnnotations = (previous, current) => {
+  const changes = []
+  const common = Math.min(previous.length, current.length)
+
+  for (let i = 0; i < common; i++) {
+    const before = previous[i]
+    const after = current[i]
+    if (before.x !== after.x || before.y !== after.y || before.label !== after.label) {
+      changes.push({ op: 'update', index: i, point: after })
+    }
+  }
+  for (let i = common; i < current.length; i++) {
+    changes.push({ op: 'add', point: current[i] })
+  }
+  // 从末尾开始删除，保证索引有效
+  for (let i = previous.length - 1; i >= current.length; i--) {
+    changes.push({ op: 'remove', index: i })
+  }
+  return changes
+}
+
+// 按窗口宽度选取结果图的金字塔级别，避免下载和解码整张原图
+const getResultImageUrl = (pyramid) => {
+  const displayWidth = Math.min(pyramid.width, window.innerWidth)
+  return pickPyramidLevel(pyramid, displayWidth).url
+}
+
 // 为不同标签生成颜色
 const getColorForLabel = (label) => {
   const colors = {
@@ -0,0 +1,13 @@
+// 根据显示尺寸从图片金字塔中挑选合适的级别
+// pyramid: 后端返回的 { width, height, levels: [{ level, width, height, url }] }
+// displayWidth: 图片在页面上的显示宽度（CSS像素）
+export const pickPyramidLevel = (pyramid, displayWidth) => {
+  if (!pyramid || !pyramid.levels || pyramid.levels.length === 0) return null
+
+  const ratio = window.devicePixelRatio || 1
+  const needed = displayWidth * ratio
+
+  // levels 按从小到大排列，取第一个宽度足够的级别，否则用原图
+  const level = pyramid.levels.find(item => item.width >= needed)
+  return level || pyramid.levels[pyramid.levels.length - 1]
+}